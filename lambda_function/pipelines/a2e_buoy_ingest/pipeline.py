@@ -1,4 +1,5 @@
 import os
+import re
 from typing import Dict
 
 import cmocean
@@ -14,7 +15,65 @@ from tsdat.utils import DSUtil
 
 example_dir = os.path.abspath(os.path.dirname(__file__))
 style_file = os.path.join(example_dir, "styling.mplstyle")
-plt.style.use(style_file)
+mpl.use("Agg")  # Plots are only written to file, so skip interactive backend probing
+style_params = mpl.rc_params_from_file(style_file, use_default_template=False)
+mpl.rcParams.update(style_params)
+
+viridis = sns.color_palette("viridis", as_cmap=True)
+line_colors = [viridis(0.00), viridis(0.60)]
+current_cmap = cmocean.cm.deep_r
+
+current_vel_pattern = re.compile(r"Vel(\d+) \(mm/s\)")
+current_dir_pattern = re.compile(r"Dir(\d+) \(deg\)")
+
+
+def _rename_surfacetemp(dataset: xr.Dataset, time_def) -> xr.Dataset:
+    return dataset.rename_vars({"Surface Temperature (C)": "surfacetemp - Surface Temperature (C)"})
+
+
+def _rename_gill(dataset: xr.Dataset, time_def) -> xr.Dataset:
+    name_mapping = {
+        "Horizontal Speed (m/s)":       "gill_horizontal_wind_speed",
+        "Horizontal Direction (deg)":   "gill_horizontal_wind_direction"
+    }
+    return dataset.rename_vars(name_mapping)
+
+
+def _build_currents(dataset: xr.Dataset, time_def) -> xr.Dataset:
+    # Find the bins that have both a velocity and a direction variable
+    vel_vars = {int(m.group(1)): m.string for m in map(current_vel_pattern.fullmatch, dataset.data_vars) if m}
+    dir_vars = {int(m.group(1)): m.string for m in map(current_dir_pattern.fullmatch, dataset.data_vars) if m}
+    bins = sorted(vel_vars.keys() & dir_vars.keys())
+    vel_names = [vel_vars[i] for i in bins]
+    dir_names = [dir_vars[i] for i in bins]
+
+    # Calculate depths and fill data vars directly into a C-ordered (time, depth) layout
+    depth = 4 * np.asarray(bins, dtype=np.int64)
+    shape = (len(dataset[time_def.get_input_name()]), len(bins))
+    vel_data = np.empty(shape, dtype=np.result_type(*(dataset[n].dtype for n in vel_names)), order="C")
+    dir_data = np.empty(shape, dtype=np.result_type(*(dataset[n].dtype for n in dir_names)), order="C")
+    for j, (vel_name, dir_name) in enumerate(zip(vel_names, dir_names)):
+        vel_data[:, j] = dataset[vel_name].values
+        dir_data[:, j] = dataset[dir_name].values
+
+    # Make time.input.name and depth coordinate variables
+    dataset = dataset.set_coords(time_def.get_input_name())
+    dataset["depth"] = xr.DataArray(data=depth, dims=["depth"])
+    dataset = dataset.set_coords("depth")
+
+    # Add current velocity and direction data to dataset
+    dataset["current_speed"] = xr.DataArray(data=vel_data, dims=["time", "depth"])
+    dataset["current_direction"] = xr.DataArray(data=dir_data, dims=["time", "depth"])
+    return dataset
+
+
+# Raw file customizations keyed by the tag in the raw file name. Every
+# matching tag is applied to each file, in the order listed here.
+raw_file_handlers = {
+    "surfacetemp": _rename_surfacetemp,
+    "gill": _rename_gill,
+    "currents": _build_currents,
+}
 
 
 class Pipeline(IngestPipeline):
@@ -56,48 +115,10 @@ class Pipeline(IngestPipeline):
         time_def = dod.get_variable("time")
         
         for filename, dataset in raw_dataset_mapping.items():
-            if "surfacetemp" in filename: 
-                old_name = "Surface Temperature (C)"
-                new_name = "surfacetemp - Surface Temperature (C)"
-                raw_dataset_mapping[filename] = dataset.rename_vars({old_name: new_name})
-
-            if "gill" in filename:
-                name_mapping = {
-                    "Horizontal Speed (m/s)":       "gill_horizontal_wind_speed",
-                    "Horizontal Direction (deg)":   "gill_horizontal_wind_direction" 
-                }
-                raw_dataset_mapping[filename] = dataset.rename_vars(name_mapping)
-            
-            if "currents" in filename:
-               
-                def has_vel_and_dir(index: int) -> bool:
-                    has_vel = f"Vel{index+1} (mm/s)" in dataset.variables
-                    has_dir = f"Dir{index+1} (deg)" in dataset.variables
-                    return has_vel and has_dir
-
-                # Calculate depths and collect data vars
-                i = 0
-                depth, vel_data, dir_data = [], [], []
-                while has_vel_and_dir(i):
-                    depth.append(4 * (i + 1))
-                    vel_data.append(dataset[f"Vel{i+1} (mm/s)"].data)
-                    dir_data.append(dataset[f"Dir{i+1} (deg)"].data)
-                    i += 1
-
-                depth = np.array(depth)
-                vel_data = np.array(vel_data).transpose()
-                dir_data = np.array(dir_data).transpose()
-
-                # Make time.input.name and depth coordinate variables
-                dataset = dataset.set_coords(time_def.get_input_name())
-                dataset["depth"] = xr.DataArray(data=depth, dims=["depth"])
-                dataset = dataset.set_coords("depth")
-
-                # Add current velocity and direction data to dataset
-                dataset["current_speed"] = xr.DataArray(data=vel_data, dims=["time", "depth"])
-                dataset["current_direction"] = xr.DataArray(data=dir_data, dims=["time", "depth"])
-
-                raw_dataset_mapping[filename] = dataset
+            for tag, handler in raw_file_handlers.items():
+                if tag in filename:
+                    dataset = handler(dataset, time_def)
+            raw_dataset_mapping[filename] = dataset
 
         # No customization to raw data - return original dataset
         return raw_dataset_mapping
@@ -140,7 +161,7 @@ class Pipeline(IngestPipeline):
         
         def double_plot(ax, twin, /, *, data, colors, var_labels=["",""], ax_labels=["",""], **kwargs):
             def _add_lineplot(_ax, _data, _c, _label, _ax_label, _spine):
-                _line = _data.plot(ax=_ax, c=_c, label=_label, linewidth=2, **kwargs)
+                _ax.plot(_data["time"].values, _data.values, color=_c, label=_label, linewidth=2, **kwargs)
                 _ax.tick_params(axis="y", which="both", colors=_c)
                 _ax.set_ylabel(_ax_label, color=_c)
                 _ax.spines[_spine].set_color(_c)
@@ -148,6 +169,12 @@ class Pipeline(IngestPipeline):
             _add_lineplot(twin, data[1], colors[1], var_labels[1], ax_labels[1], "right")
             twin.spines["left"].set_color(colors[0])  # twin overwrites ax, so set color here
 
+        def save_figure(fig, filename):
+            with self.storage._tmp.get_temp_filepath(filename) as tmp_path:
+                # Fast zlib level; PNGs are slightly larger but encode several times quicker
+                fig.savefig(tmp_path, dpi=100, pil_kwargs={"compress_level": 1, "optimize": False})
+                self.storage.save(tmp_path)
+
         def add_colorbar(ax, plot, label):
             cb = plt.colorbar(plot, ax=ax, pad=0.01)
             cb.ax.set_ylabel(label, fontsize=12)
@@ -158,118 +185,133 @@ class Pipeline(IngestPipeline):
 
         # Useful variables
         ds = dataset
-        date = pd.to_datetime(ds.time.data[0]).strftime('%d-%b-%Y')
-        cmap = sns.color_palette("viridis", as_cmap=True)
-        colors = [cmap(0.00), cmap(0.60)]
+        date = pd.to_datetime(np.asarray(ds.time.data)[0]).strftime('%d-%b-%Y')
+        title_suffix = f"at {ds.attrs['location_meaning']} on {date}"
+
+        # Decimate line plot data to ~2 points per horizontal pixel (14 in at 100 dpi)
+        stride = len(ds.time) // (1400 * 2)
+        ds_plot = ds.isel(time=slice(None, None, stride)) if stride > 1 else ds
+
+        # Reuse a single figure for all plots so the canvas and fonts are set up once
+        fig = plt.figure(figsize=(14, 8), constrained_layout=True)
 
         # Create the first plot -- Surface Met Parameters
         filename = DSUtil.get_plot_filename(dataset, "surface_met_parameters", "png")
-        with self.storage._tmp.get_temp_filepath(filename) as tmp_path:
 
-            # Define data and metadata
-            data = [
-                [ds.wind_speed, ds.wind_direction], 
-                [ds.pressure, ds.rh], 
-                [ds.air_temperature, ds.CTD_SST]]
-            var_labels = [
-                [r"$\overline{\mathrm{U}}$ Cup", r"$\overline{\mathrm{\theta}}$ Cup"],
-                ["Pressure", "Relative Humidity"],
-                ["Air Temperature", "Sea Surface Temperature"]]
-            ax_labels = [
-                [r"$\overline{\mathrm{U}}$ (ms$^{-1}$)", r"$\bar{\mathrm{\theta}}$ (degrees)"],
-                [r"$\overline{\mathrm{P}}$ (bar)", r"$\overline{\mathrm{RH}}$ (%)"],
-                [r"$\overline{\mathrm{T}}_{air}$ ($\degree$C)", r"$\overline{\mathrm{SST}}$ ($\degree$C)"]]
-
-            # Create figure and axes objects
-            fig, axs = plt.subplots(nrows=3, figsize=(14, 8), constrained_layout=True)
-            twins = [ax.twinx() for ax in axs]
-            fig.suptitle(f"Surface Met Parameters at {ds.attrs['location_meaning']} on {date}")
-
-            # Create the plots
-            gill_data = [ds.gill_wind_speed, ds.gill_wind_direction]
-            gill_labels = [r"$\overline{\mathrm{U}}$ Gill", r"$\overline{\mathrm{\theta}}$ Gill"]
-            double_plot(axs[0], twins[0], data=gill_data, colors=colors, var_labels=gill_labels, linestyle="--")
-            for i in range(3):
-                double_plot(axs[i], twins[i], data=data[i], colors=colors, var_labels=var_labels[i], ax_labels=ax_labels[i])
-                axs[i].grid(which="both", color='lightgray', linewidth=0.5)
-                lines = axs[i].lines + twins[i].lines
-                labels = [line.get_label() for line in lines]
-                axs[i].legend(lines, labels, ncol=len(labels), bbox_to_anchor=(1, -0.15))
-                format_time_xticks(axs[i])
-                axs[i].set_xlabel("Time (UTC)")
-            twins[0].set_ylim(0, 360)
-
-            # Save and close the figure
-            fig.savefig(tmp_path, dpi=100)
-            self.storage.save(tmp_path)
-            plt.close()
+        # Define data and metadata
+        data = [
+            [ds_plot.wind_speed, ds_plot.wind_direction], 
+            [ds_plot.pressure, ds_plot.rh], 
+            [ds_plot.air_temperature, ds_plot.CTD_SST]]
+        var_labels = [
+            [r"$\overline{\mathrm{U}}$ Cup", r"$\overline{\mathrm{\theta}}$ Cup"],
+            ["Pressure", "Relative Humidity"],
+            ["Air Temperature", "Sea Surface Temperature"]]
+        ax_labels = [
+            [r"$\overline{\mathrm{U}}$ (ms$^{-1}$)", r"$\bar{\mathrm{\theta}}$ (degrees)"],
+            [r"$\overline{\mathrm{P}}$ (bar)", r"$\overline{\mathrm{RH}}$ (%)"],
+            [r"$\overline{\mathrm{T}}_{air}$ ($\degree$C)", r"$\overline{\mathrm{SST}}$ ($\degree$C)"]]
+
+        # Clear the figure and create axes objects
+        fig.clf()
+        axs = fig.subplots(nrows=3)
+        twins = [ax.twinx() for ax in axs]
+        fig.suptitle(f"Surface Met Parameters {title_suffix}")
+
+        # Create the plots
+        gill_data = [ds_plot.gill_wind_speed, ds_plot.gill_wind_direction]
+        gill_labels = [r"$\overline{\mathrm{U}}$ Gill", r"$\overline{\mathrm{\theta}}$ Gill"]
+        double_plot(axs[0], twins[0], data=gill_data, colors=line_colors, var_labels=gill_labels, linestyle="--")
+        for i in range(3):
+            double_plot(axs[i], twins[i], data=data[i], colors=line_colors, var_labels=var_labels[i], ax_labels=ax_labels[i])
+            axs[i].grid(which="both", color='lightgray', linewidth=0.5)
+            lines = axs[i].lines + twins[i].lines
+            labels = [line.get_label() for line in lines]
+            axs[i].legend(lines, labels, ncol=len(labels), bbox_to_anchor=(1, -0.15))
+            format_time_xticks(axs[i])
+            axs[i].set_xlabel("Time (UTC)")
+        twins[0].set_ylim(0, 360)
+
+        # Save the figure
+        save_figure(fig, filename)
 
         # Create the second plot -- Conductivity and Sea Surface Temperature
         filename = DSUtil.get_plot_filename(dataset, "conductivity", "png")
-        with self.storage._tmp.get_temp_filepath(filename) as tmp_path:
 
-            # Define data and metadata
-            data = [ds.conductivity, ds.CTD_SST]
-            var_labels = [r"Conductivity (S m$^{-1}$)", r"$\overline{\mathrm{SST}}$ ($\degree$C)"]
-            ax_labels = [r"Conductivity (S m$^{-1}$)", r"$\overline{\mathrm{SST}}$ ($\degree$C)"]
-
-            # Create the figure and axes objects
-            fig, ax = plt.subplots(figsize=(14, 8), constrained_layout=True)
-            fig.suptitle(f"Conductivity and Sea Surface Temperature at {ds.attrs['location_meaning']} on {date}")
-            twin = ax.twinx()
-
-            # Make the plot
-            double_plot(ax, twin, data=data, colors=colors, var_labels=var_labels, ax_labels=ax_labels)
-            
-            # Set the labels and ticks
-            ax.grid(which="both", color='lightgray', linewidth=0.5)
-            lines = ax.lines + twin.lines
-            labels = [line.get_label() for line in lines]
-            ax.legend(lines, labels, ncol=len(labels), bbox_to_anchor=(1, -0.03))
-            format_time_xticks(ax)
-            ax.set_xlabel("Time (UTC)")
+        # Define data and metadata
+        data = [ds_plot.conductivity, ds_plot.CTD_SST]
+        var_labels = [r"Conductivity (S m$^{-1}$)", r"$\overline{\mathrm{SST}}$ ($\degree$C)"]
+        ax_labels = [r"Conductivity (S m$^{-1}$)", r"$\overline{\mathrm{SST}}$ ($\degree$C)"]
+
+        # Clear the figure and create axes objects
+        fig.clf()
+        ax = fig.subplots()
+        fig.suptitle(f"Conductivity and Sea Surface Temperature {title_suffix}")
+        twin = ax.twinx()
+
+        # Make the plot
+        double_plot(ax, twin, data=data, colors=line_colors, var_labels=var_labels, ax_labels=ax_labels)
+        
+        # Set the labels and ticks
+        ax.grid(which="both", color='lightgray', linewidth=0.5)
+        lines = ax.lines + twin.lines
+        labels = [line.get_label() for line in lines]
+        ax.legend(lines, labels, ncol=len(labels), bbox_to_anchor=(1, -0.03))
+        format_time_xticks(ax)
+        ax.set_xlabel("Time (UTC)")
 
-            # Save and close the figure
-            fig.savefig(tmp_path, dpi=100)
-            self.storage.save(tmp_path)
-            plt.close()      
+        # Save the figure
+        save_figure(fig, filename)
 
         # Create the third plot - current speed and direction
         filename = DSUtil.get_plot_filename(dataset, "current_velocity", "png")
-        with self.storage._tmp.get_temp_filepath(filename) as tmp_path:
 
-            # Reduce dimensionality of dataset for plotting
-            ds_1H: xr.Dataset = ds.reindex({"depth": ds.depth.data[::2]})
+        # Reduce dimensionality of the current direction for the quiver arrows. Selecting
+        # it first keeps the other variables out of the depth subset and resample.
+        ds_1H: xr.Dataset = ds[["current_direction"]].isel(depth=slice(None, None, 2))
+        time = ds_1H.time.data
+        time_step = np.diff(time)
+        one_hour = np.timedelta64(1, "h")
+        starts_on_hour = len(time) and time[0] == time[0].astype("datetime64[h]")
+        if starts_on_hour and len(time_step) and (time_step == time_step[0]).all() and one_hour % time_step[0] == 0:
+            # Regular cadence that evenly divides an hour and starts on the hour -- every
+            # nth sample lands on the same hourly timestamps that resample would pick
+            hourly_stride = int(one_hour // time_step[0])
+            ds_1H: xr.Dataset = ds_1H.isel(time=slice(None, None, hourly_stride))
+        else:
             ds_1H: xr.Dataset = ds_1H.resample(time="1H").nearest()
 
-            # Calculations for contour plots
-            levels = 30
-
-            # Calculations for quiver plot
-            qv_slice = slice(1, None)  # Skip first to prevent weird overlap with axes borders
-            qv_degrees = ds_1H.current_direction.data[qv_slice, qv_slice].transpose()
-            qv_theta = (qv_degrees + 90) * (np.pi/180)
-            X, Y = ds_1H.time.data[qv_slice], ds_1H.depth.data[qv_slice]
-            U, V = np.cos(-qv_theta), np.sin(-qv_theta)
-
-            # Create figure and axes objects
-            fig, ax = plt.subplots(figsize=(14,8), constrained_layout=True)
-            fig.suptitle(f"Current Speed and Direction at {ds.attrs['location_meaning']} on {date}")
-
-            # Make the plots
-            csf = ds.current_speed.plot.contourf(ax=ax, x="time", yincrease=False, levels=levels, cmap=cmocean.cm.deep_r, add_colorbar=False)
-            # ds.current_speed.plot.contour(ax=ax, x="time", yincrease=False, levels=levels, colors="lightgray", linewidths=0.5)
-            ax.quiver(X, Y, U, V, width=0.002, scale=60, color="white", pivot='middle', zorder=10)
-            add_colorbar(ax, csf, r"Current Speed (mm s$^{-1}$)")
-            
-            # Set the labels and ticks
-            format_time_xticks(ax)
-            ax.set_xlabel("Time (UTC)")
-            ax.set_ylabel("Depth (m)")
-
-            # Save the figure
-            fig.savefig(tmp_path, dpi=100)
-            self.storage.save(tmp_path)
-            plt.close()
+        # Calculations for quiver plot
+        qv_slice = slice(1, None)  # Skip first to prevent weird overlap with axes borders
+        qv_degrees = ds_1H.current_direction.data[qv_slice, qv_slice].transpose()
+        X, Y = ds_1H.time.data[qv_slice], ds_1H.depth.data[qv_slice]
+
+        # U = cos(-(θ+90°)) = -sin(θ) and V = sin(-(θ+90°)) = -cos(θ). Work in place so
+        # only the theta and U buffers are allocated; V reuses the theta buffer.
+        qv_theta = np.deg2rad(qv_degrees, dtype=np.float32)
+        U = np.sin(qv_theta)
+        np.negative(U, out=U)
+        V = np.cos(qv_theta, out=qv_theta)
+        np.negative(V, out=V)
+
+        # Clear the figure and create axes objects
+        fig.clf()
+        ax = fig.subplots()
+        fig.suptitle(f"Current Speed and Direction {title_suffix}")
+
+        # Make the plots. The heatmap stays at full resolution so data gaps remain visible;
+        # pcolormesh draws one quad per cell, so this is cheap.
+        csf = ds.current_speed.plot.pcolormesh(ax=ax, x="time", yincrease=False, cmap=current_cmap, add_colorbar=False, shading="auto", rasterized=True)
+        ax.quiver(X, Y, U, V, width=0.002, scale=60, color="white", pivot='middle', zorder=10)
+        add_colorbar(ax, csf, r"Current Speed (mm s$^{-1}$)")
+        
+        # Set the labels and ticks
+        format_time_xticks(ax)
+        ax.set_xlabel("Time (UTC)")
+        ax.set_ylabel("Depth (m)")
+
+        # Save and close the figure
+        save_figure(fig, filename)
+        plt.close(fig)
 
         return
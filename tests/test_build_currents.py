@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+import numpy as np
+import xarray as xr
+
+# Add the project directory to the pythonpath
+test_dir = os.path.dirname(os.path.realpath(__file__))
+project_dir = os.path.dirname(test_dir)
+lambda_dir = os.path.join(project_dir, 'lambda_function')
+sys.path.insert(0, lambda_dir)
+
+from pipelines.a2e_buoy_ingest.pipeline import _build_currents
+
+
+class TimeDefinition:
+    """Minimal stand-in for the tsdat time VariableDefinition."""
+    def get_input_name(self):
+        return "DataTimeStamp"
+
+
+class TestBuildCurrents(unittest.TestCase):
+    """-------------------------------------------------------------------
+    Tests building the current_speed and current_direction variables
+    from the per-bin columns of the raw currents csv.
+    -------------------------------------------------------------------"""
+    def setUp(self) -> None:
+        # Bins 1, 2 and 4 are complete; bin 3 is missing and bin 5 has
+        # no direction column, so only bins 1, 2 and 4 should be used.
+        self.n_time = 6
+        data_vars = {"DataTimeStamp": ("index", np.arange(self.n_time))}
+        for i in [1, 2, 4, 5]:
+            data_vars[f"Vel{i} (mm/s)"] = ("index", np.full(self.n_time, 10.0 * i))
+        for i in [1, 2, 4]:
+            data_vars[f"Dir{i} (deg)"] = ("index", np.full(self.n_time, 1.0 * i))
+        self.raw = xr.Dataset(data_vars)
+        self.dataset = _build_currents(self.raw, TimeDefinition())
+
+    def test_bin_discovery_and_depth(self):
+        np.testing.assert_array_equal(self.dataset["depth"].values, [4, 8, 16])
+        self.assertEqual(self.dataset["depth"].dtype, np.int64)
+        self.assertIn("depth", self.dataset.coords)
+        self.assertIn("DataTimeStamp", self.dataset.coords)
+
+    def test_shape_dtype_and_values(self):
+        for name in ["current_speed", "current_direction"]:
+            self.assertEqual(self.dataset[name].dims, ("time", "depth"))
+            self.assertEqual(self.dataset[name].shape, (self.n_time, 3))
+            self.assertEqual(self.dataset[name].dtype, self.raw["Vel1 (mm/s)"].dtype)
+        np.testing.assert_array_equal(self.dataset["current_speed"].values[0], [10.0, 20.0, 40.0])
+        np.testing.assert_array_equal(self.dataset["current_direction"].values[0], [1.0, 2.0, 4.0])
+
+
+if __name__ == '__main__':
+    unittest.main()